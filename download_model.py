@@ -3,14 +3,30 @@
 Download the original DeepSeek V3 PyTorch weights from Hugging Face.
 """
 
-from huggingface_hub import hf_hub_download
 import os
 
+def enable_hf_transfer():
+    """Turn on hf_transfer's parallel chunked downloads if it's installed"""
+    try:
+        import hf_transfer  # noqa: F401
+    except ImportError:
+        print("\nTip: pip install hf_transfer for much faster downloads")
+        return False
+
+    os.environ["HF_HUB_ENABLE_HF_TRANSFER"] = "1"
+    return True
+
 def download_model():
     print("=" * 70)
     print("Downloading DeepSeek V3 PyTorch Weights")
     print("=" * 70)
     
+    # huggingface_hub reads HF_HUB_ENABLE_HF_TRANSFER at import time,
+    # so it has to be set before the import below
+    if enable_hf_transfer():
+        print("\nUsing hf_transfer (parallel download)")
+    from huggingface_hub import hf_hub_download
+    
     os.makedirs("model_weights", exist_ok=True)
     
     try:
@@ -4,41 +4,316 @@ Remap custom DeepSeek PyTorch weights to MLX naming convention
 WITH unified intermediate size (pad routed experts to match shared expert)
 
 Usage:
-    python remap_weights_for_mlx_unified.py [path/to/weights.pt]
+    python remap_weights_for_mlx_unified.py [path/to/weights.pt] [--dtype float16|float32]
 
 If no path provided, uses: model_weights/best_deepseek_v3.pt
+Weights are written as float16 by default (what MLX runs in on device).
 """
 
-import torch
+import argparse
 import numpy as np
-from safetensors.numpy import save_file
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from pathlib import Path
+import collections
+import json
+import os
+import pickle
+import re
+import struct
 import sys
-
-def pad_weight(weight_np, target_shape):
-    """Pad weight to target shape (zero-padding for new dimensions)"""
-    if weight_np.shape == target_shape:
-        return weight_np
-
-    # For gate_proj and up_proj: [out_dim, in_dim] -> pad out_dim
-    if len(weight_np.shape) == 2:
-        current_shape = weight_np.shape
-        pad_out = target_shape[0] - current_shape[0]
-        pad_in = target_shape[1] - current_shape[1]
-
-        if pad_out > 0 or pad_in > 0:
-            padded = np.pad(weight_np, ((0, pad_out), (0, pad_in)), mode='constant')
-            return padded
-
-    # For biases: [out_dim] -> pad out_dim
-    elif len(weight_np.shape) == 1:
-        pad_amt = target_shape[0] - weight_np.shape[0]
-        if pad_amt > 0:
-            return np.pad(weight_np, (0, pad_amt), mode='constant')
-
-    return weight_np
-
-def remap_weights(input_path, output_dir="POC/mlx_model"):
+import zipfile
+
+# h.<layer>.  and  h.<layer>.mlp.experts.<expert>.
+LAYER_KEY_RE = re.compile(r"h\.(\d+)\.")
+EXPERT_KEY_RE = re.compile(r"mlp\.experts\.(\d+)\.")
+
+# Byte alignment of tensor data in the written file, so MLX can use aligned
+# loads when it maps the weights on device
+TENSOR_ALIGNMENT = 64
+
+# --dtype choices for the written weights
+OUTPUT_DTYPES = {
+    "float16": np.float16,
+    "float32": np.float32,
+}
+
+# numpy dtype -> safetensors header dtype tag
+SAFETENSORS_DTYPES = {
+    np.dtype(np.float32): "F32",
+    np.dtype(np.float16): "F16",
+}
+
+class StreamingSafetensorsWriter:
+    """Write a safetensors file one tensor at a time.
+
+    The header (names, shapes, data offsets) is written up front, then each
+    tensor body is filled in place through a memmap of the data section, so
+    the remapped weights never have to exist as one big dict in RAM.
+    """
+
+    def __init__(self, path, shapes, dtype=np.float32, metadata=None):
+        self.dtype = np.dtype(dtype)
+        self.shapes = {name: tuple(shape) for name, shape in shapes.items()}
+
+        header = {}
+        if metadata:
+            # Free-form string -> string map, read back with safe_open(...).metadata()
+            header["__metadata__"] = {k: str(v) for k, v in metadata.items()}
+        nbytes = {name: int(np.prod(shape, dtype=np.int64)) * self.dtype.itemsize
+                  for name, shape in self.shapes.items()}
+
+        # safetensors doesn't allow gaps between tensors, so alignment comes from
+        # ordering: tensors sized in whole TENSOR_ALIGNMENT blocks are laid out first
+        # (each then starts aligned), the few odd-sized ones are packed at the end
+        layout = sorted(self.shapes, key=lambda name: nbytes[name] % TENSOR_ALIGNMENT != 0)
+
+        offset = 0
+        for name in layout:
+            shape = self.shapes[name]
+            header[name] = {
+                "dtype": SAFETENSORS_DTYPES[self.dtype],
+                "shape": list(shape),
+                "data_offsets": [offset, offset + nbytes[name]],
+            }
+            offset += nbytes[name]
+        self.offsets = {name: header[name]["data_offsets"] for name in self.shapes}
+
+        # Header is padded with spaces so the data section starts TENSOR_ALIGNMENT-aligned
+        header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        header_bytes += b" " * (-(8 + len(header_bytes)) % TENSOR_ALIGNMENT)
+        data_start = 8 + len(header_bytes)
+
+        with open(path, "wb") as f:
+            f.write(struct.pack("<Q", len(header_bytes)))
+            f.write(header_bytes)
+            # Extending the file leaves the data section zero-filled
+            f.truncate(data_start + offset)
+
+        if offset > 0:
+            self._data = np.memmap(path, dtype=np.uint8, mode="r+", offset=data_start, shape=(offset,))
+        else:
+            self._data = np.zeros(0, dtype=np.uint8)
+
+    def view(self, name):
+        """Writable array backed by the file region of tensor `name`"""
+        start, end = self.offsets[name]
+        return self._data[start:end].view(self.dtype).reshape(self.shapes[name])
+
+    def close(self):
+        if isinstance(self._data, np.memmap):
+            self._data.flush()
+        self._data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+@contextmanager
+def atomic_output(path):
+    """Yield a temp path next to `path`, renamed over it only if the write succeeds
+
+    The temp file is in the same directory (same filesystem), so os.replace is
+    atomic and a killed run never leaves a truncated file that looks valid.
+    """
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+class BF16Bits:
+    """Raw bf16 bits (uint16) of a checkpoint tensor, widened to fp32 when copied"""
+
+    def __init__(self, bits):
+        self.bits = bits
+        self.shape = bits.shape
+
+def bf16_to_float32(bits):
+    """Widen bf16 bits (uint16) to fp32 - bf16 is the top half of an fp32"""
+    return (bits.astype(np.uint32) << 16).view(np.float32)
+
+# torch.<Type>Storage pickle globals -> numpy dtype of the raw storage
+TORCH_STORAGE_DTYPES = {
+    "FloatStorage": np.float32,
+    "HalfStorage": np.float16,
+    "BFloat16Storage": np.uint16,
+    "DoubleStorage": np.float64,
+    "LongStorage": np.int64,
+    "IntStorage": np.int32,
+    "ShortStorage": np.int16,
+    "CharStorage": np.int8,
+    "ByteStorage": np.uint8,
+    "BoolStorage": np.bool_,
+}
+
+class CheckpointUnpickler(pickle.Unpickler):
+    """Unpickle a torch.save state_dict into numpy views of its storages
+
+    Only the globals a plain state_dict needs are allowed; anything else
+    raises UnpicklingError so the caller can fall back to torch.load.
+    """
+
+    def __init__(self, file, load_storage):
+        super().__init__(file)
+        self.load_storage = load_storage
+
+    def find_class(self, module, name):
+        if (module, name) == ("collections", "OrderedDict"):
+            return collections.OrderedDict
+        if (module, name) == ("torch._utils", "_rebuild_tensor_v2"):
+            return rebuild_tensor
+        if (module, name) == ("torch._utils", "_rebuild_parameter"):
+            return lambda data, requires_grad, backward_hooks: data
+        if module == "torch" and name in TORCH_STORAGE_DTYPES:
+            return name
+        raise pickle.UnpicklingError(f"Unsupported global in checkpoint: {module}.{name}")
+
+    def persistent_load(self, pid):
+        typename, storage_type, key, location, numel = pid
+        if typename != "storage":
+            raise pickle.UnpicklingError(f"Unsupported persistent id: {typename}")
+        return self.load_storage(key, storage_type, numel)
+
+def rebuild_tensor(storage, storage_offset, size, stride, requires_grad=False, backward_hooks=None, metadata=None):
+    """Tensor as a (read-only) strided numpy view into its storage"""
+    storage_type, data = storage
+    itemsize = data.dtype.itemsize
+    view = np.lib.stride_tricks.as_strided(
+        data[storage_offset:],
+        shape=tuple(size),
+        strides=tuple(s * itemsize for s in stride),
+        writeable=False,
+    )
+    return BF16Bits(view) if storage_type == "BFloat16Storage" else view
+
+def mmap_checkpoint(input_path):
+    """Read a torch.save zip checkpoint without torch, memory-mapping every storage
+
+    torch.save stores tensor storages uncompressed as archive entries, so each
+    one is a plain byte range of the file that numpy can map directly.
+    """
+    data = np.memmap(input_path, dtype=np.uint8, mode="r")
+
+    with zipfile.ZipFile(input_path) as archive, open(input_path, "rb") as f:
+        pkl_name = next(n for n in archive.namelist() if n.endswith("/data.pkl") or n == "data.pkl")
+        prefix = pkl_name[:-len("data.pkl")]
+
+        if prefix + "byteorder" in archive.namelist() and archive.read(prefix + "byteorder") != b"little":
+            raise pickle.UnpicklingError("Big-endian checkpoint")
+
+        def load_storage(key, storage_type, numel):
+            info = archive.getinfo(f"{prefix}data/{key}")
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise pickle.UnpicklingError(f"Compressed storage: {info.filename}")
+
+            # Entry data starts after the local file header (30 bytes + name + extra)
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack("<HH", f.read(4))
+            start = info.header_offset + 30 + name_len + extra_len
+
+            dtype = np.dtype(TORCH_STORAGE_DTYPES[storage_type])
+            return storage_type, data[start:start + numel * dtype.itemsize].view(dtype)
+
+        with archive.open(pkl_name) as pkl:
+            return CheckpointUnpickler(pkl, load_storage).load()
+
+def load_state_dict(input_path):
+    """Load the checkpoint as numpy views, falling back to torch.load for anything unusual"""
+    try:
+        return mmap_checkpoint(input_path)
+    except (zipfile.BadZipFile, pickle.UnpicklingError, StopIteration, KeyError) as e:
+        print(f"  ⚠ Direct read failed ({e}), falling back to torch.load")
+
+    import torch
+    # mmap only works for the zip format; legacy checkpoints are read eagerly
+    return torch.load(input_path, map_location="cpu", mmap=zipfile.is_zipfile(input_path), weights_only=True)
+
+def to_numpy(tensor):
+    """Zero-copy numpy view of a checkpoint tensor (bf16 is widened to fp32, numpy has no bf16)"""
+    if isinstance(tensor, np.ndarray):
+        return tensor
+    if isinstance(tensor, BF16Bits):
+        return bf16_to_float32(tensor.bits)
+
+    # torch.Tensor from the torch.load fallback
+    import torch
+    if tensor.dtype in (torch.float32, torch.float16) and tensor.is_contiguous():
+        return np.from_dlpack(tensor.detach())
+    if tensor.dtype == torch.bfloat16:
+        return bf16_to_float32(tensor.detach().view(torch.int16).numpy().view(np.uint16))
+    return tensor.detach().numpy()
+
+def copy_into(out, w):
+    """Copy w into the leading corner of out (any rank); the zero-filled rest is padding"""
+    out[tuple(slice(0, n) for n in w.shape)] = w
+
+def copy_from(state_dict, key, shape=None):
+    """Plan a copy of `key` (zero-padded up to `shape` if given), releasing the source tensor once written"""
+    def fill(out):
+        copy_into(out, to_numpy(state_dict.pop(key)))
+    return tuple(shape or state_dict[key].shape), fill
+
+def constant(value):
+    """Plan a tensor with fixed contents (weights the PyTorch model doesn't have)"""
+    def fill(out):
+        out[...] = value
+    return value.shape, fill
+
+def kv_a_proj(state_dict, kv_proj_key, k_rope_proj_key):
+    """Plan kv_a_proj_with_mqa: kv_proj followed by the first head of k_rope_proj"""
+    kv_rows, hidden = state_dict[kv_proj_key].shape
+
+    def fill(out):
+        kv_proj = to_numpy(state_dict.pop(kv_proj_key))  # [128, 512]
+        k_rope_proj = to_numpy(state_dict.pop(k_rope_proj_key))  # [256, 512]
+
+        # Rows [0:128] = kv_proj, rows [128:160] = first 32 dims (one head worth of rope)
+        np.copyto(out[:kv_rows], kv_proj)
+        np.copyto(out[kv_rows:], k_rope_proj[:32, :])
+
+    return (kv_rows + 32, hidden), fill
+
+def kv_b_proj(state_dict, k_decompress_key, v_decompress_key, num_heads, head_dim, nope_dim):
+    """Plan kv_b_proj: per-head [k_nope, v] interleaved from k_decompress and v_decompress"""
+    kv_lora_rank = state_dict[k_decompress_key].shape[1]
+
+    def fill(out):
+        k_decompress = to_numpy(state_dict.pop(k_decompress_key))  # [512, 128]
+        v_decompress = to_numpy(state_dict.pop(v_decompress_key))  # [512, 128]
+
+        # PyTorch outputs: k_content (512 = 8*64), v (512 = 8*64)
+        # MLX expects: interleaved [k_nope, v] per head
+        # k_nope = first 32 dims of k per head, v = 64 dims per head
+
+        # Reshape to per-head: [num_heads, head_dim, kv_lora_rank]
+        k_per_head = k_decompress.reshape(num_heads, head_dim, -1)  # [8, 64, 128]
+        v_per_head = v_decompress.reshape(num_heads, head_dim, -1)  # [8, 64, 128]
+
+        # Fill per-head [k_nope (first 32 dims of k), v] directly into the
+        # [768, 128] output viewed as [8, 96, 128] - no concatenated temporary
+        out_per_head = out.reshape(num_heads, nope_dim + head_dim, kv_lora_rank)
+        np.copyto(out_per_head[:, :nope_dim, :], k_per_head[:, :nope_dim, :])
+        np.copyto(out_per_head[:, nope_dim:, :], v_per_head)
+
+    return (num_heads * (nope_dim + head_dim), kv_lora_rank), fill
+
+def stack_experts(state_dict, keys, expert_shape):
+    """Plan a switch_mlp stack: each expert is copied straight into its slice"""
+    def fill(out):
+        # out starts zero-filled, so copying into the leading corner zero-pads
+        # smaller routed experts up to the unified size
+        for j, key in enumerate(keys):
+            copy_into(out[j], to_numpy(state_dict.pop(key)))
+
+    return (len(keys),) + tuple(expert_shape), fill
+
+def remap_weights(input_path, output_dir="POC/mlx_model", dtype="float16"):
     """Remap PyTorch weights to MLX format with unified intermediate size"""
 
     print("=" * 70)
@@ -50,17 +325,30 @@ def remap_weights(input_path, output_dir="POC/mlx_model"):
     if not Path(input_path).exists():
         raise FileNotFoundError(f"Weight file not found: {input_path}")
 
-    state_dict = torch.load(input_path, map_location="cpu")
+    # Tensor storages are memory-mapped straight from the checkpoint (no torch
+    # import); pages are only faulted in when a tensor is copied
+    state_dict = load_state_dict(input_path)
     print(f"  ✓ Loaded {len(state_dict)} weight tensors")
 
-    # Auto-detect number of layers
-    layer_keys = [k for k in state_dict.keys() if k.startswith('h.')]
-    num_layers = max([int(k.split('.')[1]) for k in layer_keys]) + 1 if layer_keys else 0
-    print(f"  ✓ Detected {num_layers} transformer layers")
+    # Auto-detect number of layers and experts in a single pass over the keys
+    max_layer = max_expert = -1
+    for key in state_dict:
+        m = LAYER_KEY_RE.match(key)
+        if m:
+            max_layer = max(max_layer, int(m.group(1)))
+            m = EXPERT_KEY_RE.match(key, m.end())
+            if m:
+                max_expert = max(max_expert, int(m.group(1)))
+
+    num_layers = max_layer + 1
+    num_experts = max_expert + 1
 
-    # Auto-detect number of experts
-    expert_keys = [k for k in state_dict.keys() if 'mlp.experts.' in k and len(k.split('.')) > 4 and k.split('.')[4].isdigit()]
-    num_experts = max([int(k.split('.')[4]) for k in expert_keys]) + 1 if expert_keys else 0
+    # Grouped checkpoints store each projection's experts as one [num_experts, out, in] tensor
+    grouped_expert_key = "h.0.mlp.experts.gate_proj.weight"
+    if num_experts == 0 and grouped_expert_key in state_dict:
+        num_experts = state_dict[grouped_expert_key].shape[0]
+
+    print(f"  ✓ Detected {num_layers} transformer layers")
     print(f"  ✓ Detected {num_experts} experts per layer")
 
     # Detect intermediate sizes
@@ -68,7 +356,12 @@ def remap_weights(input_path, output_dir="POC/mlx_model"):
     routed_expert_key = "h.0.mlp.experts.0.gate_proj.weight"
     shared_expert_key = "h.0.mlp.shared_expert.gate_proj.weight"
 
-    routed_size = state_dict[routed_expert_key].shape[0] if routed_expert_key in state_dict else 512
+    if routed_expert_key in state_dict:
+        routed_size = state_dict[routed_expert_key].shape[0]
+    elif grouped_expert_key in state_dict:
+        routed_size = state_dict[grouped_expert_key].shape[1]
+    else:
+        routed_size = 512
     shared_size = state_dict[shared_expert_key].shape[0] if shared_expert_key in state_dict else 768
 
     print(f"  Routed expert intermediate size: {routed_size}")
@@ -82,29 +375,51 @@ def remap_weights(input_path, output_dir="POC/mlx_model"):
         print(f"  ⚠ Will pad routed experts from {routed_size} to {unified_size}")
 
     # Create mapping from our names to MLX names
+    # Each entry is (shape, fill) - fill(out) writes the tensor into its slot in the output file
     print(f"\n[3/5] Remapping weight names...")
     mlx_weights = {}
     mapped_count = 0
 
     # Embedding layer: wte -> model.embed_tokens
     if "wte.weight" in state_dict:
-        mlx_weights["model.embed_tokens.weight"] = state_dict["wte.weight"].numpy()
+        mlx_weights["model.embed_tokens.weight"] = copy_from(state_dict, "wte.weight")
         mapped_count += 1
         print(f"  ✓ Mapped embedding layer")
 
-    # Transformer layers
-    for i in range(num_layers):
+    # Layer-invariant dimensions, looked up once rather than per layer
+    hidden_size = state_dict["wte.weight"].shape[1]
+    q_lora_rank = 192
+    num_heads = 8
+    head_dim = 64
+    nope_dim = 32
+
+    # Filler weights the PyTorch model doesn't have are identical for every
+    # layer, so one read-only array each is shared across all layers
+    q_a_layernorm_ones = np.ones(q_lora_rank, dtype=np.float32)
+    e_score_bias_zeros = np.zeros(num_experts, dtype=np.float32)
+    q_a_layernorm_ones.setflags(write=False)
+    e_score_bias_zeros.setflags(write=False)
+
+    # Per-expert shape inside each switch_mlp stack
+    expert_shapes = {
+        "gate_proj": (unified_size, hidden_size),
+        "up_proj": (unified_size, hidden_size),
+        "down_proj": (hidden_size, unified_size),
+    }
+
+    # Transformer layers - each layer's tensors are planned into their own dict
+    # so the layers can be written out in parallel
+    def remap_layer(i):
+        local = {}
         prefix_old = f"h.{i}"
         prefix_new = f"model.layers.{i}"
 
         # Layer norms
         if f"{prefix_old}.ln_1.weight" in state_dict:
-            mlx_weights[f"{prefix_new}.input_layernorm.weight"] = state_dict[f"{prefix_old}.ln_1.weight"].numpy()
-            mapped_count += 1
+            local[f"{prefix_new}.input_layernorm.weight"] = copy_from(state_dict, f"{prefix_old}.ln_1.weight")
 
         if f"{prefix_old}.ln_2.weight" in state_dict:
-            mlx_weights[f"{prefix_new}.post_attention_layernorm.weight"] = state_dict[f"{prefix_old}.ln_2.weight"].numpy()
-            mapped_count += 1
+            local[f"{prefix_new}.post_attention_layernorm.weight"] = copy_from(state_dict, f"{prefix_old}.ln_2.weight")
 
         # Attention weights (with special handling for kv_a_proj_with_mqa)
 
@@ -117,14 +432,11 @@ def remap_weights(input_path, output_dir="POC/mlx_model"):
 
         for old_key, new_key in simple_attn_mappings.items():
             if old_key in state_dict:
-                mlx_weights[new_key] = state_dict[old_key].numpy()
-                mapped_count += 1
+                local[new_key] = copy_from(state_dict, old_key)
 
         # q_a_layernorm: PyTorch model doesn't have this, create identity (all ones)
         # MLX expects RMSNorm with dimensions=q_lora_rank (192)
-        q_lora_rank = 192
-        mlx_weights[f"{prefix_new}.self_attn.q_a_layernorm.weight"] = np.ones(q_lora_rank, dtype=np.float32)
-        mapped_count += 1
+        local[f"{prefix_new}.self_attn.q_a_layernorm.weight"] = constant(q_a_layernorm_ones)
 
         # kv_a_proj_with_mqa: Concatenate kv_proj + first head of k_rope_proj
         # PyTorch: kv_proj [128, 512], k_rope_proj [256, 512] (8 heads × 32)
@@ -133,16 +445,7 @@ def remap_weights(input_path, output_dir="POC/mlx_model"):
         k_rope_proj_key = f"{prefix_old}.attn.k_rope_proj.weight"
 
         if kv_proj_key in state_dict and k_rope_proj_key in state_dict:
-            kv_proj = state_dict[kv_proj_key].numpy()  # [128, 512]
-            k_rope_proj = state_dict[k_rope_proj_key].numpy()  # [256, 512]
-
-            # Extract first 32 dimensions (one head worth of rope)
-            k_rope_head = k_rope_proj[:32, :]  # [32, 512]
-
-            # Concatenate: [128, 512] + [32, 512] = [160, 512]
-            kv_a_proj_combined = np.concatenate([kv_proj, k_rope_head], axis=0)
-            mlx_weights[f"{prefix_new}.self_attn.kv_a_proj_with_mqa.weight"] = kv_a_proj_combined
-            mapped_count += 1
+            local[f"{prefix_new}.self_attn.kv_a_proj_with_mqa.weight"] = kv_a_proj(state_dict, kv_proj_key, k_rope_proj_key)
 
         # kv_b_proj: Need to handle k_decompress and v_decompress separately
         # PyTorch: k_decompress [512, 128], v_decompress [512, 128]
@@ -152,112 +455,70 @@ def remap_weights(input_path, output_dir="POC/mlx_model"):
         v_decompress_key = f"{prefix_old}.attn.v_decompress.weight"
 
         if k_decompress_key in state_dict and v_decompress_key in state_dict:
-            k_decompress = state_dict[k_decompress_key].numpy()  # [512, 128]
-            v_decompress = state_dict[v_decompress_key].numpy()  # [512, 128]
-
-            # PyTorch outputs: k_content (512 = 8*64), v (512 = 8*64)
-            # MLX expects: interleaved [k_nope, v] per head
-            # k_nope = first 32 dims of k per head, v = 64 dims per head
-
-            num_heads = 8
-            head_dim = 64
-            nope_dim = 32
-
-            # Reshape to per-head: [num_heads, head_dim, kv_lora_rank]
-            k_per_head = k_decompress.reshape(num_heads, head_dim, -1)  # [8, 64, 128]
-            v_per_head = v_decompress.reshape(num_heads, head_dim, -1)  # [8, 64, 128]
-
-            # Extract k_nope (first 32 dims) and concatenate with v
-            k_nope = k_per_head[:, :nope_dim, :]  # [8, 32, 128]
-            combined = np.concatenate([k_nope, v_per_head], axis=1)  # [8, 96, 128]
-
-            # Flatten back: [768, 128]
-            kv_b_combined = combined.reshape(-1, 128)
-            mlx_weights[f"{prefix_new}.self_attn.kv_b_proj.weight"] = kv_b_combined
-            mapped_count += 1
+            local[f"{prefix_new}.self_attn.kv_b_proj.weight"] = kv_b_proj(
+                state_dict, k_decompress_key, v_decompress_key, num_heads, head_dim, nope_dim)
 
         # Output projection
         o_proj_key = f"{prefix_old}.attn.o_proj.weight"
         if o_proj_key in state_dict:
-            mlx_weights[f"{prefix_new}.self_attn.o_proj.weight"] = state_dict[o_proj_key].numpy()
-            mapped_count += 1
+            local[f"{prefix_new}.self_attn.o_proj.weight"] = copy_from(state_dict, o_proj_key)
 
         # Router (gate)
         if f"{prefix_old}.mlp.router.weight" in state_dict:
-            mlx_weights[f"{prefix_new}.mlp.gate.weight"] = state_dict[f"{prefix_old}.mlp.router.weight"].numpy()
-            mapped_count += 1
+            local[f"{prefix_new}.mlp.gate.weight"] = copy_from(state_dict, f"{prefix_old}.mlp.router.weight")
 
         # e_score_correction_bias: PyTorch model doesn't have this, create zeros
         # MLX uses this for load balancing in MoE routing
         # Shape: [n_routed_experts] = [8]
-        mlx_weights[f"{prefix_new}.mlp.gate.e_score_correction_bias"] = np.zeros(num_experts, dtype=np.float32)
-        mapped_count += 1
+        local[f"{prefix_new}.mlp.gate.e_score_correction_bias"] = constant(e_score_bias_zeros)
 
         # Experts: Stack all experts into switch_mlp format
         # MLX uses SwitchGLU which expects stacked expert weights
         # Shape: [num_experts, intermediate, hidden] for gate/up_proj
         #        [num_experts, hidden, intermediate] for down_proj
-        hidden_size = state_dict["wte.weight"].shape[1]
-
-        gate_proj_experts = []
-        up_proj_experts = []
-        down_proj_experts = []
-
-        for j in range(num_experts):
-            # Collect and pad each expert's weights
-            gate_key = f"{prefix_old}.mlp.experts.{j}.gate_proj.weight"
-            up_key = f"{prefix_old}.mlp.experts.{j}.up_proj.weight"
-            down_key = f"{prefix_old}.mlp.experts.{j}.down_proj.weight"
-
-            if gate_key in state_dict:
-                gate_weight = state_dict[gate_key].numpy()
-                gate_padded = pad_weight(gate_weight, (unified_size, hidden_size))
-                gate_proj_experts.append(gate_padded)
-
-            if up_key in state_dict:
-                up_weight = state_dict[up_key].numpy()
-                up_padded = pad_weight(up_weight, (unified_size, hidden_size))
-                up_proj_experts.append(up_padded)
-
-            if down_key in state_dict:
-                down_weight = state_dict[down_key].numpy()
-                down_padded = pad_weight(down_weight, (hidden_size, unified_size))
-                down_proj_experts.append(down_padded)
-
-        # Stack all experts: [num_experts, ...]
-        if gate_proj_experts:
-            mlx_weights[f"{prefix_new}.mlp.switch_mlp.gate_proj.weight"] = np.stack(gate_proj_experts)
-            mapped_count += 1
-
-        if up_proj_experts:
-            mlx_weights[f"{prefix_new}.mlp.switch_mlp.up_proj.weight"] = np.stack(up_proj_experts)
-            mapped_count += 1
-
-        if down_proj_experts:
-            mlx_weights[f"{prefix_new}.mlp.switch_mlp.down_proj.weight"] = np.stack(down_proj_experts)
-            mapped_count += 1
-
-        # Shared expert (should already be unified_size, but verify)
+        # Stack all experts: [num_experts, ...], one contiguous 3D tensor per projection
+        for proj, expert_shape in expert_shapes.items():
+            # Already grouped: copy the whole stack in one go (zero-padded like single experts)
+            grouped_key = f"{prefix_old}.mlp.experts.{proj}.weight"
+            if grouped_key in state_dict and len(state_dict[grouped_key].shape) == 3:
+                local[f"{prefix_new}.mlp.switch_mlp.{proj}.weight"] = copy_from(
+                    state_dict, grouped_key, (state_dict[grouped_key].shape[0],) + expert_shape)
+                continue
+
+            keys = [f"{prefix_old}.mlp.experts.{j}.{proj}.weight" for j in range(num_experts)]
+            keys = [k for k in keys if k in state_dict]
+            if keys:
+                local[f"{prefix_new}.mlp.switch_mlp.{proj}.weight"] = stack_experts(state_dict, keys, expert_shape)
+
+        # Shared expert (normally already unified_size; padded if the routed experts are larger)
         if f"{prefix_old}.mlp.shared_expert.gate_proj.weight" in state_dict:
-            mlx_weights[f"{prefix_new}.mlp.shared_experts.gate_proj.weight"] = state_dict[f"{prefix_old}.mlp.shared_expert.gate_proj.weight"].numpy()
-            mlx_weights[f"{prefix_new}.mlp.shared_experts.up_proj.weight"] = state_dict[f"{prefix_old}.mlp.shared_expert.up_proj.weight"].numpy()
-            mlx_weights[f"{prefix_new}.mlp.shared_experts.down_proj.weight"] = state_dict[f"{prefix_old}.mlp.shared_expert.down_proj.weight"].numpy()
+            local[f"{prefix_new}.mlp.shared_experts.gate_proj.weight"] = copy_from(
+                state_dict, f"{prefix_old}.mlp.shared_expert.gate_proj.weight", (unified_size, hidden_size))
+            local[f"{prefix_new}.mlp.shared_experts.up_proj.weight"] = copy_from(
+                state_dict, f"{prefix_old}.mlp.shared_expert.up_proj.weight", (unified_size, hidden_size))
+            local[f"{prefix_new}.mlp.shared_experts.down_proj.weight"] = copy_from(
+                state_dict, f"{prefix_old}.mlp.shared_expert.down_proj.weight", (hidden_size, unified_size))
 
             # Skip shared expert biases - MLX doesn't use bias in MLP layers
 
-            mapped_count += 3
+        return local
+
+    layer_weights = [remap_layer(i) for i in range(num_layers)]
+    for local in layer_weights:
+        mlx_weights.update(local)
+        mapped_count += len(local)
 
     print(f"  ✓ Mapped {num_layers} transformer layers")
 
     # Final layer norm
     if "ln_f.weight" in state_dict:
-        mlx_weights["model.norm.weight"] = state_dict["ln_f.weight"].numpy()
+        mlx_weights["model.norm.weight"] = copy_from(state_dict, "ln_f.weight")
         mapped_count += 1
         print(f"  ✓ Mapped final layer norm")
 
     # LM head
     if "lm_head.weight" in state_dict:
-        mlx_weights["lm_head.weight"] = state_dict["lm_head.weight"].numpy()
+        mlx_weights["lm_head.weight"] = copy_from(state_dict, "lm_head.weight")
         mapped_count += 1
         print(f"  ✓ Mapped LM head")
 
@@ -271,14 +532,43 @@ def remap_weights(input_path, output_dir="POC/mlx_model"):
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
-    weights_file = output_path / "weights.safetensors"
-    save_file(mlx_weights, str(weights_file))
+    # Conversion details are stored in the safetensors header (__metadata__)
+    metadata = {
+        "source_file": str(input_path),
+        "num_layers": num_layers,
+        "num_experts": num_experts,
+        "routed_intermediate_size": routed_size,
+        "shared_intermediate_size": shared_size,
+        "unified_intermediate_size": unified_size,
+        "total_weights": len(mlx_weights),
+        "dtype": dtype,
+        "padding_applied": routed_size != unified_size,
+    }
 
-    print(f"  ✓ Saved to: {weights_file}")
+    # Tensors are produced one at a time straight into the output file,
+    # and each source tensor is dropped from state_dict as soon as it's consumed
+    weights_file = output_path / "weights.safetensors"
+    shapes = {name: shape for name, (shape, _) in mlx_weights.items()}
+    layer_names = {name for local in layer_weights for name in local}
+    other_weights = {name: plan for name, plan in mlx_weights.items() if name not in layer_names}
+
+    with atomic_output(weights_file) as tmp_file, StreamingSafetensorsWriter(tmp_file, shapes, OUTPUT_DTYPES[dtype], metadata) as writer:
+        def write_all(plans):
+            for name, (_, fill) in plans.items():
+                fill(writer.view(name))
+
+        # Layers touch disjoint keys and disjoint file regions, and numpy
+        # releases the GIL while copying, so they can be written concurrently
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+            futures = [pool.submit(write_all, plans) for plans in [other_weights] + layer_weights]
+            for future in as_completed(futures):
+                future.result()
+
+    print(f"  ✓ Saved to: {weights_file} ({dtype})")
     print(f"    Size: {weights_file.stat().st_size / (1024*1024):.2f} MB")
+    print(f"    Conversion metadata embedded in the safetensors header")
 
     # Update config.json with unified intermediate size
-    import json
     config_file = output_path / "config.json"
     with open(config_file, 'r') as f:
         config = json.load(f)
@@ -286,28 +576,11 @@ def remap_weights(input_path, output_dir="POC/mlx_model"):
     config["moe_intermediate_size"] = unified_size
     config["n_shared_experts"] = 1
 
-    with open(config_file, 'w') as f:
+    with atomic_output(config_file) as tmp_file, open(tmp_file, 'w') as f:
         json.dump(config, f, indent=2)
 
     print(f"  ✓ Updated config.json: moe_intermediate_size={unified_size}, n_shared_experts=1")
 
-    # Also save a metadata file for tracking
-    metadata = {
-        "source_file": str(input_path),
-        "num_layers": num_layers,
-        "num_experts": num_experts,
-        "routed_intermediate_size": routed_size,
-        "shared_intermediate_size": shared_size,
-        "unified_intermediate_size": unified_size,
-        "total_weights": len(mlx_weights),
-        "padding_applied": routed_size != unified_size,
-    }
-
-    metadata_file = output_path / "weight_mapping_info.json"
-    with open(metadata_file, 'w') as f:
-        json.dump(metadata, f, indent=2)
-    print(f"  ✓ Saved metadata: {metadata_file}")
-
     print("\n" + "=" * 70)
     print("✅ Weight remapping complete!")
     print("=" * 70)
@@ -318,15 +591,16 @@ def remap_weights(input_path, output_dir="POC/mlx_model"):
     print("\n  Or simply rebuild - if you already have them in Copy Bundle Resources!")
 
 if __name__ == "__main__":
-    # Get input path from command line or use default
-    if len(sys.argv) > 1:
-        input_path = sys.argv[1]
-    else:
-        input_path = "model_weights/best_deepseek_v3.pt"
+    parser = argparse.ArgumentParser(description="Remap DeepSeek PyTorch weights to MLX format")
+    parser.add_argument("input_path", nargs="?", default="model_weights/best_deepseek_v3.pt",
+                        help="PyTorch checkpoint (default: model_weights/best_deepseek_v3.pt)")
+    parser.add_argument("--dtype", choices=list(OUTPUT_DTYPES), default="float16",
+                        help="dtype of the written weights (default: float16)")
+    args = parser.parse_args()
 
     try:
-        remap_weights(input_path)
+        remap_weights(args.input_path, dtype=args.dtype)
     except Exception as e:
         print(f"\n✗ Error: {e}")
-        print("\nUsage: python remap_weights_for_mlx_unified.py [path/to/weights.pt]")
+        print("\nUsage: python remap_weights_for_mlx_unified.py [path/to/weights.pt] [--dtype float16|float32]")
         sys.exit(1)
@@ -4,8 +4,49 @@ Verify that all MLX-expected weights are present in the safetensors file.
 This simulates what MLX will look for when loading the model.
 """
 
-from safetensors.numpy import load_file
+from safetensors import safe_open
+from itertools import islice
 import json
+import sys
+
+# Weights outside the transformer layers
+GLOBAL_WEIGHTS = [
+    "model.embed_tokens.weight",
+    "model.norm.weight",
+    "lm_head.weight",
+]
+
+# Weights every transformer layer must have ({prefix} = model.layers.N)
+PER_LAYER_TEMPLATES = [
+    # Layer norms
+    "{prefix}.input_layernorm.weight",
+    "{prefix}.post_attention_layernorm.weight",
+
+    # Attention
+    "{prefix}.self_attn.q_a_proj.weight",
+    "{prefix}.self_attn.q_a_layernorm.weight",
+    "{prefix}.self_attn.q_b_proj.weight",
+    "{prefix}.self_attn.kv_a_proj_with_mqa.weight",
+    "{prefix}.self_attn.kv_a_layernorm.weight",
+    "{prefix}.self_attn.kv_b_proj.weight",
+    "{prefix}.self_attn.o_proj.weight",
+
+    # MoE Gate
+    "{prefix}.mlp.gate.weight",
+    "{prefix}.mlp.gate.e_score_correction_bias",
+
+    # Routed experts (stacked as switch_mlp)
+    "{prefix}.mlp.switch_mlp.gate_proj.weight",
+    "{prefix}.mlp.switch_mlp.up_proj.weight",
+    "{prefix}.mlp.switch_mlp.down_proj.weight",
+]
+
+# Shared expert weights (only when n_shared_experts > 0)
+SHARED_EXPERT_TEMPLATES = [
+    "{prefix}.mlp.shared_experts.gate_proj.weight",
+    "{prefix}.mlp.shared_experts.up_proj.weight",
+    "{prefix}.mlp.shared_experts.down_proj.weight",
+]
 
 def verify_weights():
     print("=" * 70)
@@ -16,8 +57,10 @@ def verify_weights():
     with open('POC/mlx_model/config.json', 'r') as f:
         config = json.load(f)
 
-    # Load weights
-    weights = load_file('POC/mlx_model/weights.safetensors')
+    # Read tensor names from the safetensors header only - no tensor data is loaded
+    with safe_open('POC/mlx_model/weights.safetensors', framework='numpy') as f:
+        present = set(f.keys())
+        conversion = f.metadata() or {}
 
     print(f"\nConfig summary:")
     print(f"  Layers: {config['num_hidden_layers']}")
@@ -26,77 +69,30 @@ def verify_weights():
     print(f"  Hidden size: {config['hidden_size']}")
     print(f"  MoE intermediate: {config['moe_intermediate_size']}")
 
-    missing = []
-
-    # Check embedding
-    required = ["model.embed_tokens.weight"]
-    for key in required:
-        if key not in weights:
-            missing.append(key)
-
-    # Check each layer
-    for i in range(config['num_hidden_layers']):
-        prefix = f"model.layers.{i}"
-
-        # Layer norms
-        required = [
-            f"{prefix}.input_layernorm.weight",
-            f"{prefix}.post_attention_layernorm.weight",
-        ]
-
-        # Attention
-        required += [
-            f"{prefix}.self_attn.q_a_proj.weight",
-            f"{prefix}.self_attn.q_a_layernorm.weight",
-            f"{prefix}.self_attn.q_b_proj.weight",
-            f"{prefix}.self_attn.kv_a_proj_with_mqa.weight",
-            f"{prefix}.self_attn.kv_a_layernorm.weight",
-            f"{prefix}.self_attn.kv_b_proj.weight",
-            f"{prefix}.self_attn.o_proj.weight",
-        ]
-
-        # MoE Gate
-        required += [
-            f"{prefix}.mlp.gate.weight",
-            f"{prefix}.mlp.gate.e_score_correction_bias",
-        ]
-
-        # Routed experts (stacked as switch_mlp)
-        required += [
-            f"{prefix}.mlp.switch_mlp.gate_proj.weight",
-            f"{prefix}.mlp.switch_mlp.up_proj.weight",
-            f"{prefix}.mlp.switch_mlp.down_proj.weight",
-        ]
-
-        # Shared expert (if enabled)
-        if config['n_shared_experts'] > 0:
-            required += [
-                f"{prefix}.mlp.shared_experts.gate_proj.weight",
-                f"{prefix}.mlp.shared_experts.up_proj.weight",
-                f"{prefix}.mlp.shared_experts.down_proj.weight",
-            ]
-
-        for key in required:
-            if key not in weights:
-                missing.append(key)
-
-    # Final norm and LM head
-    required = [
-        "model.norm.weight",
-        "lm_head.weight",
-    ]
-    for key in required:
-        if key not in weights:
-            missing.append(key)
+    if conversion:
+        print(f"\nConversion info (safetensors header):")
+        for key, value in conversion.items():
+            print(f"  {key}: {value}")
+
+    # Every weight MLX will look for, built once as a set
+    templates = PER_LAYER_TEMPLATES
+    if config['n_shared_experts'] > 0:
+        templates = templates + SHARED_EXPERT_TEMPLATES
+
+    required = set(GLOBAL_WEIGHTS)
+    required |= {t.format(prefix=f"model.layers.{i}")
+                 for i in range(config['num_hidden_layers'])
+                 for t in templates}
+
+    missing = sorted(required - present)
 
     print(f"\nVerification results:")
-    print(f"  Total weights in file: {len(weights)}")
+    print(f"  Total weights in file: {len(present)}")
     print(f"  Missing weights: {len(missing)}")
 
     if missing:
         print("\n❌ MISSING WEIGHTS:")
-        for key in missing[:10]:  # Show first 10
-            print(f"  - {key}")
+        print("\n".join(f"  - {key}" for key in islice(missing, 10)))  # Show first 10
         if len(missing) > 10:
             print(f"  ... and {len(missing) - 10} more")
         return False
@@ -106,5 +102,4 @@ def verify_weights():
         return True
 
 if __name__ == "__main__":
-    success = verify_weights()
-    exit(0 if success else 1)
+    sys.exit(0 if verify_weights() else 1)